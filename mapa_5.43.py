@@ -1,68 +1,173 @@
 # mapa_salas_streamlit.py
 
+import numpy as np
 import pandas as pd
 import streamlit as st
 from openpyxl import load_workbook
 import random
 import io
+import html
+import hashlib
 from datetime import date
 
+# Estilo dos mapas de sala, enviado uma única vez junto com todos os mapas
+CSS_MAPA = """
+<style>
+.grid-mapa {
+    border-collapse: collapse;
+    margin: 20px auto;
+    font-family: Arial, sans-serif;
+    max-width: 1260px;
+}
+.grid-mapa td {
+    width: 120px;
+    height: 100px;
+    border: 1px solid #333;
+    text-align: center;
+    vertical-align: middle;
+    padding: 5px;
+}
+.assento {
+    display: flex;
+    flex-direction: column;
+    justify-content: center;
+    align-items: center;
+    height: 100%;
+    font-size: 12px;
+    overflow: hidden;
+}
+.assento small {
+    font-size: 9px;
+    color: #666;
+}
+</style>
+"""
+
+# Fragmentos de HTML das células do mapa
+TD_ASSENTO = "<td><div class='assento'><strong>{}</strong><br><small>{}</small></div></td>"
+TD_VAZIO = "<td></td>"
+
 # ------------------------------
 # Funções auxiliares
 # ------------------------------
 
-def carregar_dados_excel(arquivo):
+def ler_dimensoes_salas(wb, abas_salas):
+    """
+    Lê as dimensões (células A2 e B2) de cada aba de sala uma única vez.
+
+    Args:
+        wb: O Workbook do Excel.
+        abas_salas (list): Lista de nomes das abas de sala.
+
+    Returns:
+        Um dicionário {sala: (n_linhas, n_colunas)}.
+    """
+    dims = {}
+    for sala_nome in abas_salas:
+        aba_sala = wb[sala_nome]
+        dims[sala_nome] = (int(aba_sala["A2"].value), int(aba_sala["B2"].value))
+    return dims
+
+@st.cache_data(show_spinner=False)
+def carregar_dados_excel(arquivo_bytes):
     """
     Carrega dados de alunos e salas do arquivo Excel.
 
+    O resultado fica em cache, indexado pelo conteúdo do arquivo, para que as
+    re-execuções do Streamlit não precisem reler a planilha.
+
     Args:
-        arquivo: O arquivo Excel enviado pelo usuário.
+        arquivo_bytes (bytes): O conteúdo do arquivo Excel enviado pelo usuário.
 
     Returns:
-        Uma tupla contendo os DataFrames dos alunos, o Workbook e uma lista de nomes de salas.
+        Uma tupla contendo os DataFrames dos alunos, uma lista de nomes de salas e
+        um dicionário {sala: (n_linhas, n_colunas)}.
     """
     try:
         # Carrega as abas de alunos usando os nomes corretos
-        df_alunos1 = pd.read_excel(arquivo, sheet_name="alunos_1")
-        df_alunos2 = pd.read_excel(arquivo, sheet_name="alunos_2")
+        df_alunos1 = pd.read_excel(io.BytesIO(arquivo_bytes), sheet_name="alunos_1")
+        df_alunos2 = pd.read_excel(io.BytesIO(arquivo_bytes), sheet_name="alunos_2")
 
-        # Carrega o workbook completo para obter os nomes das abas de sala
-        wb = load_workbook(arquivo)
+        # Carrega o workbook em modo somente leitura: só precisamos dos nomes das
+        # abas de sala e dos valores de A2/B2, não dos estilos
+        wb = load_workbook(io.BytesIO(arquivo_bytes), read_only=True, data_only=True, keep_links=False)
         abas_salas = wb.sheetnames[:-2]
-        
-        return df_alunos1, df_alunos2, wb, abas_salas
+        dims = ler_dimensoes_salas(wb, abas_salas)
+        wb.close()
+
+        return df_alunos1, df_alunos2, abas_salas, dims
     except Exception as e:
         st.error(f"Erro ao carregar o arquivo Excel. Verifique se as abas 'alunos_1' e 'alunos_2' existem. Erro: {e}")
         return None, None, None, None
 
+@st.cache_data(show_spinner=False)
 def filtrar_e_preparar_alunos(df):
     """
-    Filtra alunos com Flex != 1, seleciona as colunas relevantes e os converte para uma lista de dicionários.
+    Filtra alunos com Flex != 1, embaralha a ordem e separa as colunas relevantes em arrays.
+
+    O resultado fica em cache, de modo que o embaralhamento é feito uma única vez
+    para cada planilha carregada.
     
     Args:
         df (pd.DataFrame): O DataFrame de alunos.
 
     Returns:
-        Uma lista de dicionários, cada um representando um aluno com as colunas necessárias.
+        Um dicionário {coluna: np.ndarray} com as colunas "nome", "turma", "RM" e "numero",
+        mais "nome_html" e "turma_html" já escapadas, todas na mesma ordem (embaralhada).
     """
     # Filtra os alunos que não são 'Flex'
-    df_filtrado = df[df["Flex"] != 1].copy()
+    mascara = df["Flex"].to_numpy() != 1
     # Embaralha a ordem dos alunos
-    df_filtrado = df_filtrado.sample(frac=1).reset_index(drop=True)
+    ordem = np.random.permutation(int(mascara.sum()))
     # Seleciona as colunas desejadas para o mapa e a lista final
     colunas_desejadas = ["nome", "turma", "RM", "numero"]
-    df_final = df_filtrado[colunas_desejadas]
-    # Converte o DataFrame para uma lista de dicionários para manipulação mais eficiente
-    return df_final.to_dict('records')
+    colunas = {c: df.loc[mascara, c].to_numpy()[ordem] for c in colunas_desejadas}
+    # Versões com escape HTML de nome e turma, feitas de uma vez para exibição no mapa;
+    # as colunas originais continuam intactas para as planilhas
+    for c in ("nome", "turma"):
+        colunas[f"{c}_html"] = (
+            pd.Series(colunas[c], dtype=object).astype(str)
+            .str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False)
+            .to_numpy()
+        )
+    return colunas
+
+def alocar_assentos(retiradas, cursores, totais):
+    """
+    Calcula, para cada assento de uma sala, o índice do aluno que o ocupa.
+
+    As colunas pares recebem alunos do grupo 1 e as ímpares do grupo 2. Dentro de
+    cada grupo os assentos livres são preenchidos coluna a coluna, de cima para
+    baixo, continuando a partir do cursor do grupo.
+
+    Args:
+        retiradas (np.ndarray): Máscara booleana (n_linhas, n_colunas) das posições retiradas.
+        cursores (list): Índice do próximo aluno de cada grupo; é atualizado no lugar.
+        totais (list): Quantidade de alunos de cada grupo.
 
-def gerar_mapas_todas_salas(alunos1, alunos2, wb, abas_salas, posicoes_retiradas_por_sala):
+    Returns:
+        Um array (n_linhas, n_colunas) com o índice do aluno no seu grupo, ou -1 se o
+        assento ficar vazio.
+    """
+    indices = np.full(retiradas.shape, -1, dtype=np.int64)
+    for g in (0, 1):
+        # Transpõe para percorrer os assentos coluna a coluna
+        livres = ~retiradas[:, g::2].T
+        ordem = np.cumsum(livres, axis=None).reshape(livres.shape) - 1 + cursores[g]
+        indices[:, g::2] = np.where(livres & (ordem < totais[g]), ordem, -1).T
+        cursores[g] = min(cursores[g] + int(livres.sum()), totais[g])
+    return indices
+
+def gerar_mapas_todas_salas(alunos1, alunos2, dims, abas_salas, posicoes_retiradas_por_sala):
     """
     Gera o mapa de alocação para todas as salas.
 
     Args:
-        alunos1 (list): Lista de alunos do grupo 1.
-        alunos2 (list): Lista de alunos do grupo 2.
-        wb: O Workbook do Excel.
+        alunos1 (dict): Colunas (arrays) dos alunos do grupo 1.
+        alunos2 (dict): Colunas (arrays) dos alunos do grupo 2.
+        dims (dict): Dicionário {sala: (n_linhas, n_colunas)}.
         abas_salas (list): Lista de nomes das abas de sala.
         posicoes_retiradas_por_sala (dict): Dicionário com as posições a serem retiradas.
 
@@ -71,104 +176,64 @@ def gerar_mapas_todas_salas(alunos1, alunos2, wb, abas_salas, posicoes_retiradas
     """
     mapas = {}
     
-    # Faz cópias das listas de alunos para que a alocação possa ser gerada novamente
-    # sem re-carregar ou re-embaralhar os dados originais.
-    alunos_g1_para_alocar = list(alunos1)
-    alunos_g2_para_alocar = list(alunos2)
+    # Índice do próximo aluno a alocar em cada grupo; os arrays originais não são
+    # alterados, então a alocação pode ser gerada novamente sem re-embaralhar.
+    grupos = [alunos1, alunos2]
+    totais = [len(alunos1["nome"]), len(alunos2["nome"])]
+    cursores = [0, 0]
 
     for sala_nome in abas_salas:
-        aba_sala = wb[sala_nome]
-        n_linhas = int(aba_sala["A2"].value)
-        n_colunas = int(aba_sala["B2"].value)
-        posicoes_retiradas = posicoes_retiradas_por_sala.get(sala_nome, [])
+        n_linhas, n_colunas = dims[sala_nome]
+        retiradas = np.zeros((n_linhas, n_colunas), dtype=bool)
+        for lin, col in posicoes_retiradas_por_sala.get(sala_nome, []):
+            retiradas[lin, col] = True
+
+        indices = alocar_assentos(retiradas, cursores, totais)
 
+        # Monta os assentos apenas para as posições ocupadas
         mapa = [[None for _ in range(n_colunas)] for _ in range(n_linhas)]
-        
-        # Itera sobre as colunas da sala para alternar os grupos de alunos
-        for col in range(n_colunas):
-            lista_alunos = alunos_g1_para_alocar if col % 2 == 0 else alunos_g2_para_alocar
-            
-            # Itera sobre as linhas dentro da coluna
-            for lin in range(n_linhas):
-                posicao_atual = (lin, col)
-                
-                if posicao_atual not in posicoes_retiradas and lista_alunos:
-                    aluno = lista_alunos.pop(0)
-                    mapa[lin][col] = {
-                        "nome": aluno.get("nome", "Nome não disponível"),
-                        "turma": aluno.get("turma", "Turma não disponível"),
-                        "RM": aluno.get("RM", "RM não disponível"),
-                        "numero": aluno.get("numero", "Número não disponível")
-                    }
+        for lin, col in zip(*np.nonzero(indices >= 0)):
+            alunos = grupos[col & 1]
+            i = indices[lin, col]
+            mapa[lin][col] = {k: alunos[k][i] for k in alunos}
 
         mapas[sala_nome] = mapa
     
-    if alunos_g1_para_alocar or alunos_g2_para_alocar:
-        st.warning(f"Atenção: Sobraram {len(alunos_g1_para_alocar)} alunos do Grupo 1 e "
-                   f"{len(alunos_g2_para_alocar)} alunos do Grupo 2 que não foram alocados.")
+    sobra_g1 = totais[0] - cursores[0]
+    sobra_g2 = totais[1] - cursores[1]
+    if sobra_g1 or sobra_g2:
+        st.warning(f"Atenção: Sobraram {sobra_g1} alunos do Grupo 1 e "
+                   f"{sobra_g2} alunos do Grupo 2 que não foram alocados.")
 
     return mapas
 
-def exibir_mapa_sala(mapa, sala_nome, data_avaliacao):
+def exibir_mapas(mapas, data_avaliacao):
     """
-    Exibe o mapa de uma sala com formatação para cópia e impressão.
+    Exibe os mapas de todas as salas, com formatação para cópia e impressão, em uma
+    única chamada ao Streamlit.
     
     Args:
-        mapa (list): O mapa de alocação da sala.
-        sala_nome (str): O nome da sala.
+        mapas (dict): Dicionário de mapas de sala.
         data_avaliacao (date): A data da avaliação.
     """
     # Formata a data para exibição
     data_formatada = data_avaliacao.strftime('%d/%m/%Y')
-    
-    st.write(f"### {sala_nome} - {data_formatada}")
-
-    css = """
-    <style>
-    .grid-mapa {
-        border-collapse: collapse;
-        margin: 20px auto;
-        font-family: Arial, sans-serif;
-        max-width: 1260px;
-    }
-    .grid-mapa td {
-        width: 120px;
-        height: 100px;
-        border: 1px solid #333;
-        text-align: center;
-        vertical-align: middle;
-        padding: 5px;
-    }
-    .assento {
-        display: flex;
-        flex-direction: column;
-        justify-content: center;
-        align-items: center;
-        height: 100%;
-        font-size: 12px;
-        overflow: hidden;
-    }
-    .assento small {
-        font-size: 9px;
-        color: #666;
-    }
-    </style>
-    """
 
-    html = "<div class='print-area'><table class='grid-mapa'>"
-    for linha in mapa:
-        html += "<tr>"
-        for assento in linha:
-            if assento is None:
-                html += "<td></td>"
-            else:
-                nome = assento.get("nome", "N/A")
-                turma = assento.get("turma", "N/A")
-                html += f"<td><div class='assento'><strong>{nome}</strong><br><small>{turma}</small></div></td>"
-        html += "</tr>"
-    html += "</table></div>"
-
-    st.markdown(css + html, unsafe_allow_html=True)
+    partes = [CSS_MAPA]
+    for sala_nome, mapa in mapas.items():
+        partes.append(f"<h3>{html.escape(str(sala_nome))} - {data_formatada}</h3>")
+        partes.append("<div class='print-area'><table class='grid-mapa'>")
+        for linha in mapa:
+            partes.append("<tr>")
+            partes.append("".join(
+                TD_VAZIO if assento is None
+                else TD_ASSENTO.format(assento.get("nome_html", "N/A"), assento.get("turma_html", "N/A"))
+                for assento in linha
+            ))
+            partes.append("</tr>")
+        partes.append("</table></div><hr>")
+
+    st.markdown("".join(partes), unsafe_allow_html=True)
 
 def gerar_lista_por_turma_global(mapas, data_avaliacao):
     """
@@ -181,38 +246,67 @@ def gerar_lista_por_turma_global(mapas, data_avaliacao):
     Returns:
         Um DataFrame do Pandas com a lista de alunos e suas alocações.
     """
-    dados = []
+    # Pré-aloca uma coluna por campo em vez de montar um dicionário por aluno
+    total = sum(assento is not None for mapa in mapas.values() for linha in mapa for assento in linha)
+    turmas = np.empty(total, dtype=object)
+    nomes = np.empty(total, dtype=object)
+    rms = np.empty(total, dtype=object)
+    numeros = np.empty(total, dtype=object)
+    salas = np.empty(total, dtype=object)
+    linhas = np.empty(total, dtype=np.int64)
+    colunas = np.empty(total, dtype=np.int64)
+
+    k = 0
     for sala_nome, mapa in mapas.items():
         for lin, linha in enumerate(mapa):
             for col, assento in enumerate(linha):
                 if assento is not None:
-                    dados.append({
-                        "turma": assento.get("turma", "N/A"),
-                        "nome": assento.get("nome", "N/A"),
-                        "RM": assento.get("RM", "N/A"),
-                        "numero": assento.get("numero", "N/A"),
-                        "sala": sala_nome,
-                        "linha": lin + 1,
-                        "coluna": col + 1,
-                        "data_avaliacao": data_avaliacao.strftime('%d/%m/%Y')
-                    })
-    return pd.DataFrame(dados)
-
+                    turmas[k] = assento.get("turma", "N/A")
+                    nomes[k] = assento.get("nome", "N/A")
+                    rms[k] = assento.get("RM", "N/A")
+                    numeros[k] = assento.get("numero", "N/A")
+                    salas[k] = sala_nome
+                    linhas[k] = lin + 1
+                    colunas[k] = col + 1
+                    k += 1
+
+    df = pd.DataFrame({
+        "turma": turmas,
+        "nome": nomes,
+        "RM": rms,
+        "numero": numeros,
+        "sala": salas,
+        "linha": linhas,
+        "coluna": colunas,
+        "data_avaliacao": data_avaliacao.strftime('%d/%m/%Y')
+    }).infer_objects()
+    # Turma e sala têm poucos valores distintos: como categorias, o groupby trabalha
+    # sobre códigos inteiros
+    df["turma"] = df["turma"].astype("category")
+    df["sala"] = df["sala"].astype("category")
+    return df
+
+@st.cache_data(show_spinner=False)
 def to_excel_bytes(df):
     """
-    Converte um DataFrame para um objeto BytesIO no formato Excel.
+    Converte um DataFrame para bytes no formato Excel.
+
+    O resultado fica em cache, indexado pelo conteúdo do DataFrame, para que as
+    re-execuções do Streamlit não precisem serializar a planilha novamente.
     
     Args:
         df (pd.DataFrame): O DataFrame a ser convertido.
 
     Returns:
-        Um objeto BytesIO com os dados do DataFrame em formato XLSX.
+        Os bytes do arquivo XLSX com os dados do DataFrame.
     """
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+    # xlsxwriter é bem mais rápido que o openpyxl para planilhas só com valores.
+    # O modo constant_memory não pode ser usado: o pandas grava coluna a coluna e
+    # esse modo descarta células fora da linha corrente.
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
         df.to_excel(writer, index=False, sheet_name='Alunos Alocados')
-    output.seek(0)
-    return output
+    return output.getvalue()
 
 # ------------------------------
 # Streamlit Interface
@@ -229,59 +323,93 @@ arquivo = st.sidebar.file_uploader("Envie o arquivo Excel", type=[".xlsx"])
 data_avaliacao = st.sidebar.date_input("Data da Avaliação", date.today())
 
 if arquivo:
-    df_1_raw, df_2_raw, wb, abas_salas = carregar_dados_excel(arquivo)
+    arquivo_bytes = arquivo.getvalue()
+    df_1_raw, df_2_raw, abas_salas, dims = carregar_dados_excel(arquivo_bytes)
     
-    if wb and abas_salas:
+    if dims and abas_salas:
         alunos1_lista = filtrar_e_preparar_alunos(df_1_raw)
         alunos2_lista = filtrar_e_preparar_alunos(df_2_raw)
 
         # Exibe o total de alunos
-        st.info(f"Total de alunos para alocar: {len(alunos1_lista)} (Grupo 1) e {len(alunos2_lista)} (Grupo 2).")
+        st.info(f"Total de alunos para alocar: {len(alunos1_lista['nome'])} (Grupo 1) e {len(alunos2_lista['nome'])} (Grupo 2).")
         
         # Exibe os detalhes das salas antes da configuração de carteiras
         st.subheader("Capacidade das Salas")
         for sala_nome in abas_salas:
-            aba_sala = wb[sala_nome]
-            n_linhas = int(aba_sala["A2"].value)
-            n_colunas = int(aba_sala["B2"].value)
+            n_linhas, n_colunas = dims[sala_nome]
             total_lugares = n_linhas * n_colunas
             st.markdown(f"**{sala_nome}:** {total_lugares} lugares | {n_linhas} linhas x {n_colunas} colunas")
         
         st.markdown("---")
 
-        posicoes_retiradas_por_sala = {}
-        for sala_nome in abas_salas:
-            st.subheader(f"Configuração de Carteiras - {sala_nome}")
-            aba_sala = wb[sala_nome]
-            n_linhas = int(aba_sala["A2"].value)
-            n_colunas = int(aba_sala["B2"].value)
-            
-            posicoes_retiradas = []
-            cols_checkbox = st.columns(n_colunas)
+        # As grades ficam dentro de um formulário: as edições só disparam uma nova
+        # execução quando o usuário pede para gerar os mapas
+        with st.form("config"):
+            posicoes_retiradas_por_sala = {}
+            for sala_nome in abas_salas:
+                st.subheader(f"Configuração de Carteiras - {sala_nome}")
+                n_linhas, n_colunas = dims[sala_nome]
             
-            for lin in range(n_linhas):
-                for col in range(n_colunas):
-                    marcado = cols_checkbox[col].checkbox("", key=f"{sala_nome}_ret_{lin}_{col}")
-                    if marcado:
-                        posicoes_retiradas.append((lin, col))
+                # Uma única grade editável por sala: marque as carteiras a retirar
+                grade_inicial = pd.DataFrame(
+                    False,
+                    index=range(1, n_linhas + 1),
+                    columns=[str(col) for col in range(1, n_colunas + 1)]
+                )
+                grade = st.data_editor(grade_inicial, key=f"grade_{sala_nome}")
+                linhas_ret, colunas_ret = np.nonzero(grade.to_numpy(dtype=bool))
+                posicoes_retiradas = list(zip(linhas_ret.tolist(), colunas_ret.tolist()))
             
-            posicoes_retiradas_por_sala[sala_nome] = posicoes_retiradas
+                posicoes_retiradas_por_sala[sala_nome] = posicoes_retiradas
 
-        if st.button("🎓 Gerar Mapas de Todas as Salas"):
-            mapas = gerar_mapas_todas_salas(alunos1_lista, alunos2_lista, wb, abas_salas, posicoes_retiradas_por_sala)
+            gerar = st.form_submit_button("🎓 Gerar Mapas de Todas as Salas")
+
+        # Identifica as entradas da geração: arquivo, carteiras retiradas e data
+        chave = hashlib.sha256(
+            arquivo_bytes + repr((posicoes_retiradas_por_sala, data_avaliacao)).encode()
+        ).hexdigest()
+        cache = st.session_state.get("mapas_cache")
+
+        if gerar and (cache is None or cache["key"] != chave):
+            mapas = gerar_mapas_todas_salas(alunos1_lista, alunos2_lista, dims, abas_salas, posicoes_retiradas_por_sala)
+            lista_global = gerar_lista_por_turma_global(mapas, data_avaliacao)
+            # Separa a lista global por turma e por sala em uma única passada cada
+            por_turma = {t: df.reset_index(drop=True) for t, df in lista_global.groupby("turma", sort=True, observed=True)}
+            por_sala = {sala: df.reset_index(drop=True) for sala, df in lista_global.groupby("sala", sort=True, observed=True)}
+
+            xlsx = {("global", None): to_excel_bytes(lista_global)}
+            for turma_nome, df_turma in por_turma.items():
+                xlsx[("turma", turma_nome)] = to_excel_bytes(df_turma)
+            for sala_nome, df_sala in por_sala.items():
+                xlsx[("sala", sala_nome)] = to_excel_bytes(df_sala)
+
+            # Guarda o resultado para que os cliques nos botões de download, que
+            # re-executam o script, não gerem os mapas nem as planilhas novamente
+            cache = {
+                "key": chave,
+                "mapas": mapas,
+                "global": lista_global,
+                "por_turma": por_turma,
+                "por_sala": por_sala,
+                "xlsx": xlsx
+            }
+            st.session_state["mapas_cache"] = cache
+
+        # Só exibe o resultado se ele corresponder às entradas atuais
+        if cache is not None and cache["key"] == chave:
+            mapas = cache["mapas"]
+            lista_global = cache["global"]
+            xlsx = cache["xlsx"]
 
             st.header("Mapas de Alocação Gerados")
-            for sala_nome, mapa in mapas.items():
-                exibir_mapa_sala(mapa, sala_nome, data_avaliacao)
-                st.write("---")
+            exibir_mapas(mapas, data_avaliacao)
 
             # Geração da lista global
             st.subheader("📄 Lista de Alocação Global")
-            lista_global = gerar_lista_por_turma_global(mapas, data_avaliacao)
             st.dataframe(lista_global, use_container_width=True)
             st.download_button(
                 "🔗 Baixar Lista Global (XLSX)",
-                data=to_excel_bytes(lista_global),
+                data=xlsx[("global", None)],
                 file_name="lista_de_alocacao_global.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
@@ -289,14 +417,13 @@ if arquivo:
             # Geração das listas por turma
             st.write("---")
             st.subheader("📄 Listas de Alocação por Turma")
-            todas_turmas = sorted(lista_global["turma"].unique())
-            for turma_nome in todas_turmas:
+            # As chaves do groupby já vêm ordenadas
+            for turma_nome, df_turma in cache["por_turma"].items():
                 with st.expander(f"Alunos da Turma: {turma_nome}"):
-                    df_turma = lista_global[lista_global["turma"] == turma_nome].reset_index(drop=True)
                     st.dataframe(df_turma, use_container_width=True)
                     st.download_button(
                         f"🔗 Baixar Lista da Turma {turma_nome} (XLSX)",
-                        data=to_excel_bytes(df_turma),
+                        data=xlsx[("turma", turma_nome)],
                         file_name=f"lista_de_alocacao_{turma_nome}.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         key=f"download_{turma_nome}"
@@ -305,16 +432,13 @@ if arquivo:
             # Geração das listas por sala
             st.write("---")
             st.subheader("📄 Listas de Alocação por Sala")
-            todas_salas = sorted(lista_global["sala"].unique())
-            for sala_nome in todas_salas:
+            for sala_nome, df_sala in cache["por_sala"].items():
                 with st.expander(f"Alunos da Sala: {sala_nome}"):
-                    df_sala = lista_global[lista_global["sala"] == sala_nome].reset_index(drop=True)
                     st.dataframe(df_sala, use_container_width=True)
                     st.download_button(
                         f"🔗 Baixar Lista da Sala {sala_nome} (XLSX)",
-                        data=to_excel_bytes(df_sala),
+                        data=xlsx[("sala", sala_nome)],
                         file_name=f"lista_de_alocacao_sala_{sala_nome}.xlsx",
                         mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
                         key=f"download_sala_{sala_nome}"
                     )
-